@@ -9,14 +9,23 @@ GEMINI_CONFIG = {
     "model": "gemini-2.5-pro",          # 使用的模型名称
     "temperature": 0.1,                 # 较低的温度以获得更一致的结果
     "response_mime_type": "application/json",  # API响应格式
-    "retry_delay": 1,                   # 重试之间的延迟（秒）
+    "retry_delay": 1,                   # 重试退避的基础延迟（秒）
+    "max_retries": 5,                   # 429/503错误的最大重试次数
+    "retry_backoff_cap": 30,            # 指数退避的延迟上限（秒）
+    "retry_jitter": 1,                  # 退避延迟的随机抖动幅度（秒）
+    "requests_per_minute": 60,          # 单个API密钥的每分钟请求配额
+    "rate_limit_burst": 5,              # 令牌桶容量（允许的突发请求数）
 }
 
 # ===================== 处理配置 =====================
 PROCESSING_CONFIG = {
-    "api_call_delay": 1,                # API调用之间的延迟（秒），避免API限制
-    "episode_processing_delay": 1,       # episode处理之间的延迟（秒）
-    "skip_existing_results": False,     # 是否跳过已存在的结果文件
+    "skip_existing_results": True,      # 跳过已有结果文件的episode（断点续跑）
+    "image_max_side": 1024,             # 上传前图片最大边长（像素）
+    "jpeg_quality": 85,                 # 上传图片的JPEG压缩质量
+    "image_cache_size": 256,            # 跨episode共享图片的LRU缓存条数
+    "enable_frame_cache": True,         # 是否将处理后的帧缓存到磁盘
+    "frame_cache_dir": "cache/processed_frames",  # 处理后帧的磁盘缓存目录
+    "image_load_workers": 8,            # 并行解码图片的线程数
 }
 
 # ===================== 提示词模板配置 =====================
@@ -70,6 +79,6 @@ BATCH_PROCESSING_CONFIG = {
     "enable_batch_mode": True,            # 是否启用批处理模式
     "batch_size": 5,                     # 批处理大小（同时处理的episode数）
     "save_intermediate_results": True,   # 是否保存中间结果
-    "resume_from_checkpoint": True,      # 是否从检查点恢复
     "checkpoint_interval": 10,           # 检查点保存间隔（处理多少个episode后保存）
+    "poll_interval": 30,                 # Batch Mode作业状态轮询间隔（秒）
 }
\ No newline at end of file
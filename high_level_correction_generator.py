@@ -6,25 +6,127 @@
 """
 
 import os
+import io
 import json
 import time
 import re
+import base64
+import asyncio
+import random
+import itertools
+import string
 from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional
-from PIL import Image
+from PIL import Image, ImageOps
 from google import genai
 from google.genai import types
+from google.genai import errors as genai_errors
 from pydantic import BaseModel
 from datetime import datetime
 
+# ijson为可选依赖：存在时标注文件按条流式解析，否则退回整体加载
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# orjson为可选依赖：JSON（反）序列化比标准库快数倍，未安装时退回json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """序列化为UTF-8字节，优先使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, ensure_ascii=False, indent=4 if indent else None).encode('utf-8')
+
+
+def _json_loads(data: Any) -> Any:
+    """从字符串/字节反序列化，优先使用orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 # 导入配置
 from config import (
     GEMINI_CONFIG,
     PROCESSING_CONFIG,
     PROMPT_CONFIG,
-    PATH_CONFIG
+    PATH_CONFIG,
+    BATCH_PROCESSING_CONFIG
 )
 
+# 提示词模板在导入时按行解析一次为(字面量, 字段名)片段，
+# 每次调用只做字符串拼接，不再重复解析模板
+_PROMPT_LINES = [
+    [(literal, field)
+     for literal, field, _spec, _conv in string.Formatter().parse(line)]
+    for line in PROMPT_CONFIG["high_level_analysis_prompt"].split('\n')
+]
+
+
+# episode ID相关的正则在模块级编译一次，避免每次调用重新编译
+_EPISODE_ID_RE = re.compile(r'episode_(\d+)_cam_high\.mp4')
+_RESULT_KEY_RE = re.compile(r'episode_(\d+)')
+
+
+def _render_prompt(**values: Any) -> str:
+    """用预解析的模板片段渲染提示词
+
+    某行的字段值全部为空时整行省略（如缺失的低层次标注），
+    生成更紧凑的提示词，减少无信息量的输入token。
+    """
+    lines = []
+    for segments in _PROMPT_LINES:
+        pieces = []
+        has_field = False
+        all_empty = True
+        for literal, field in segments:
+            pieces.append(literal)
+            if field is not None:
+                has_field = True
+                value = str(values[field])
+                if value:
+                    all_empty = False
+                pieces.append(value)
+        if has_field and all_empty:
+            continue
+        lines.append(''.join(pieces))
+    return '\n'.join(lines)
+
+
+class _TokenBucket:
+    """异步令牌桶限速器
+
+    以恒定速率补充令牌、允许突发到桶容量，取代固定sleep节流：
+    低负载时调用无需等待，高负载时平均速率精确贴住配额上限。
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self._rate = rate_per_minute / 60.0
+        self._capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """取走一个令牌，不足时等待补充"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity,
+                                   self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
 
 class HighLevelAnalysis(BaseModel):
     """高层次分析结果的数据模型"""
@@ -39,27 +141,80 @@ class HighLevelCorrectionGenerator:
     def __init__(self, api_key: Optional[str] = None):
         """
         初始化生成器
-        
+
         Args:
-            api_key: Gemini API密钥，如果不提供则从环境变量GEMINI_API_KEY读取
+            api_key: Gemini API密钥，如果不提供则从环境变量GEMINI_API_KEY读取。
+                     另可通过GEMINI_API_KEYS（逗号分隔）提供多个密钥，
+                     调用时轮换使用以叠加各密钥的速率限额。
         """
         if api_key:
             os.environ['GEMINI_API_KEY'] = api_key
-        
-        self.client = genai.Client()
+
+        # 密钥池：每个密钥一个client，generate_content调用按轮换分摊
+        pool_keys = [k.strip() for k in os.environ.get('GEMINI_API_KEYS', '').split(',') if k.strip()]
+        if pool_keys:
+            self._clients = [genai.Client(api_key=key) for key in pool_keys]
+        else:
+            self._clients = [genai.Client()]
+        # 文件上传/批处理作业等有状态操作固定使用第一个client
+        self.client = self._clients[0]
+        self._client_cycle = itertools.cycle(self._clients)
         self.model = GEMINI_CONFIG["model"]
+        # 限速额度随密钥池大小叠加
+        self._rate_limiter = _TokenBucket(
+            GEMINI_CONFIG["requests_per_minute"] * len(self._clients),
+            GEMINI_CONFIG["rate_limit_burst"]
+        )
         
         # 创建输出目录
         self.output_dir = Path('output')
         self.output_dir.mkdir(exist_ok=True)
+
+        # 按任务缓存解析后的episode列表，计数与处理共用同一次解析
+        self._episode_cache = {}
     
-    def _load_image(self, image_path: str) -> Image.Image:
-        """加载图片"""
+    @lru_cache(maxsize=PROCESSING_CONFIG["image_cache_size"])
+    def _load_image(self, image_path: str) -> types.Part:
+        """加载图片，缩放到配置的最大边长并压缩为JPEG字节
+
+        全分辨率帧会让单次调用上传几十MB，耗时以网络传输为主；
+        缩放到Gemini的有效分辨率附近可将上传体积减少约5-20倍。
+        直接传JPEG字节也避免了SDK对PIL对象的重复编码。
+
+        关键帧常被多个episode共用，按路径做LRU缓存后同一帧只
+        解码/编码一次；缓存的是压缩后的JPEG字节，内存开销很小。
+        """
         full_path = Path('data') / image_path
         if not full_path.exists():
             raise FileNotFoundError(f"图片文件不存在，已尝试路径: {full_path}")
-        
-        return Image.open(full_path)
+
+        max_side = PROCESSING_CONFIG["image_max_side"]
+        quality = PROCESSING_CONFIG["jpeg_quality"]
+
+        # 磁盘缓存：同一帧在多次运行之间只需缩放/编码一次
+        cache_path = None
+        if PROCESSING_CONFIG["enable_frame_cache"]:
+            cache_path = (Path(PROCESSING_CONFIG["frame_cache_dir"])
+                          / f"{max_side}_q{quality}" / image_path).with_suffix('.jpg')
+            if cache_path.exists() and cache_path.stat().st_mtime >= full_path.stat().st_mtime:
+                return types.Part.from_bytes(data=cache_path.read_bytes(), mime_type='image/jpeg')
+
+        img = Image.open(full_path)
+        # JPEG帧用draft模式按比例降采样解码，避免全像素解码后再缩放
+        img.draft('RGB', (max_side, max_side))
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        # EXIF方向在缩放后的小图上归一化一次；结果进缓存后
+        # 每个不同的帧在整个流水线中只做一次方向变换
+        img = ImageOps.exif_transpose(img)
+        buffer = io.BytesIO()
+        img.convert('RGB').save(buffer, format='JPEG', quality=quality)
+        data = buffer.getvalue()
+
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_bytes(data)
+
+        return types.Part.from_bytes(data=data, mime_type='image/jpeg')
     
     def _extract_episode_id(self, episode_data: Dict[str, Any]) -> int:
         """从episode数据中提取真实的episode ID"""
@@ -68,33 +223,42 @@ class HighLevelCorrectionGenerator:
         
         if video_path:
             # 使用正则表达式提取episode ID，格式：task_name/videos/episode_XX_cam_high.mp4
-            match = re.search(r'episode_(\d+)_cam_high\.mp4', video_path)
+            match = _EPISODE_ID_RE.search(video_path)
             if match:
                 return int(match.group(1))
         
         # 如果失败，返回0
         return 0
     
-    def _load_all_episode_images(self, episode_data: Dict[str, Any]) -> List[Image.Image]:
-        """加载episode中的所有图片，包括序列图片和关键帧"""
-        images = []
-        image_paths = []
-        
-        # 加载序列中的所有图片
-        episode_images = episode_data.get('images', [])
-        for img_path in episode_images:
-            try:
-                img = self._load_image(img_path)
-                images.append(img)
-                image_paths.append(img_path)
-            except Exception as e:
-                print(f"  警告: 无法加载图片 {img_path}: {e}")
-        
+    def _load_one_image(self, img_path: str) -> Optional[types.Part]:
+        """加载单张图片，失败时打印警告并返回None"""
+        try:
+            return self._load_image(img_path)
+        except Exception as e:
+            print(f"  警告: 无法加载图片 {img_path}: {e}")
+            return None
+
+    def _load_all_episode_images(self, episode_data: Dict[str, Any]) -> List[types.Part]:
+        """加载episode中的所有图片，包括序列图片和关键帧
+
+        解码/缩放/编码是CPU和磁盘I/O混合负载，用线程池并行处理；
+        同时处于解码状态的帧数不超过线程数，内存保持有界。
+        """
+        # 序列帧与关键帧可能重复引用同一张图片；去重（保持顺序）后
+        # 同一帧只在请求中出现一次，减少上传字节和输入token
+        raw_paths = episode_data.get('images', [])
+        image_paths = list(dict.fromkeys(raw_paths))
+        if len(image_paths) < len(raw_paths):
+            print(f"  已去除 {len(raw_paths) - len(image_paths)} 张重复图片")
+        with ThreadPoolExecutor(max_workers=PROCESSING_CONFIG["image_load_workers"]) as executor:
+            images = [part for part in executor.map(self._load_one_image, image_paths)
+                      if part is not None]
+
         print(f"  成功加载 {len(images)} 张图片")
-        
+
         if len(images) > 100:
             print(f"  图片数量 ({len(images)}) 较多，请注意API限制")
-        
+
         return images
     
     def _create_analysis_prompt(self, episode_data: Dict[str, Any]) -> str:
@@ -107,8 +271,8 @@ class HighLevelCorrectionGenerator:
             if 0 <= subtask_idx < len(episode_data['subtasks']):
                 failed_subtask_description = episode_data['subtasks'][subtask_idx]
         
-        # 使用配置中的提示词模板
-        prompt = PROMPT_CONFIG["high_level_analysis_prompt"].format(
+        # 使用导入时预解析的提示词模板
+        prompt = _render_prompt(
             task=episode_data['task'],
             failure_subtask=episode_data['failure_subtask'],
             failed_subtask_description=failed_subtask_description,
@@ -118,37 +282,80 @@ class HighLevelCorrectionGenerator:
         )
         return prompt
     
-    def _call_gemini_api(self, prompt: str, images: List[Image.Image], response_schema: type) -> Any:
-        """调用Gemini API进行图片理解和文本生成"""
-        try:
-            # 准备内容列表
-            contents = [images]
-            contents.extend([prompt])
-
-            config = types.GenerateContentConfig(
-                response_mime_type=GEMINI_CONFIG["response_mime_type"],
-                response_schema=response_schema,
-                temperature=GEMINI_CONFIG["temperature"],  # 较低的温度以获得更一致的结果
-            )
-            # 调用API
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=config
-            )
-            
-            return response.parsed
-            
-        except Exception as e:
-            print(f"API调用失败: {e}")
-            return None
+    async def _call_gemini_api(self, prompt: str, images: List[types.Part], response_schema: type) -> Any:
+        """调用Gemini API进行图片理解和文本生成
+
+        对429/503（限流/过载）错误做指数退避重试；其他异常直接抛出，
+        由上层区分可重试错误与致命错误。
+        """
+        # 准备内容列表
+        contents = [images]
+        contents.extend([prompt])
+
+        config = types.GenerateContentConfig(
+            response_mime_type=GEMINI_CONFIG["response_mime_type"],
+            response_schema=response_schema,
+            temperature=GEMINI_CONFIG["temperature"],  # 较低的温度以获得更一致的结果
+        )
+
+        max_retries = GEMINI_CONFIG["max_retries"]
+        for attempt in range(max_retries):
+            try:
+                await self._rate_limiter.acquire()
+                # 调用异步API，便于多个episode并发执行；client按密钥池轮换
+                client = next(self._client_cycle)
+                response = await client.aio.models.generate_content(
+                    model=self.model,
+                    contents=contents,
+                    config=config
+                )
+                return response.parsed
+            except genai_errors.APIError as e:
+                if e.code not in (429, 503) or attempt == max_retries - 1:
+                    raise
+                # 指数退避加随机抖动；若服务端返回建议等待时间则优先使用
+                delay = min(
+                    GEMINI_CONFIG["retry_backoff_cap"],
+                    GEMINI_CONFIG["retry_delay"] * 2 ** attempt
+                ) + random.uniform(0, GEMINI_CONFIG["retry_jitter"])
+                server_delay = getattr(e, 'retry_delay', None)
+                if server_delay:
+                    delay = max(delay, float(server_delay))
+                print(f"  API限流/过载 ({e.code})，{delay:.1f}秒后重试 ({attempt + 1}/{max_retries})...")
+                await asyncio.sleep(delay)
+
+        return None
+
+    def _iter_episodes(self, annotation_path: Path):
+        """流式逐条读取标注文件中的episode
+
+        标注文件是一个大JSON数组；用ijson按条解析时内存与单条episode
+        大小同阶，而不是整个文件。未安装ijson时退回json.load。
+        """
+        if ijson is not None:
+            with open(annotation_path, 'rb') as f:
+                yield from ijson.items(f, 'item')
+        else:
+            with open(annotation_path, 'rb') as f:
+                yield from _json_loads(f.read())
+
+    def _load_task_episodes(self, task_name: str) -> List:
+        """解析任务的标注文件并缓存episode列表
+
+        返回 (原始索引, episode_id, episode数据) 三元组列表。缓存条目
+        由process_task消费后释放，内存占用不随任务数累积。
+        """
+        if task_name not in self._episode_cache:
+            annotation_path = Path('data') / f"{task_name}/{task_name}_annotations.json"
+            self._episode_cache[task_name] = [
+                (idx, self._extract_episode_id(episode_data), episode_data)
+                for idx, episode_data in enumerate(self._iter_episodes(annotation_path))
+            ]
+        return self._episode_cache[task_name]
 
     def _episode_id_count(self, task_name: str) -> int:
         """统计任务中episode的数量"""
-        annotation_file = Path('data') / f"{task_name}/{task_name}_annotations.json"
-        with open(annotation_file, 'r', encoding='utf-8') as f:
-            episodes = json.load(f)
-        return len(episodes)
+        return len(self._load_task_episodes(task_name))
     
     def parse_episode_selection(self, selection: str, max_count: int) -> Optional[List[int]]:
         """解析用户输入的episode选择，支持空/ALL/单个/列表/区间组合
@@ -192,24 +399,28 @@ class HighLevelCorrectionGenerator:
                     print(f"  警告: 非法索引 '{token}'，已跳过")
         return sorted(selected_indices)
     
-    def generate_high_level_analysis(self, episode_data: Dict[str, Any]) -> Optional[HighLevelAnalysis]:
+    async def generate_high_level_analysis(self, episode_data: Dict[str, Any]) -> Optional[HighLevelAnalysis]:
         """生成单个episode的高层次分析"""
+        # 未检测到失败的episode不需要分析，更不需要加载任何图片
+        if episode_data.get('failure_detection', '') != 'yes':
+            return None
+
         print(f"正在处理高层次分析: {episode_data.get('video', 'Unknown')}")
-        
+
         try:
-            # 加载所有episode图片
-            images = self._load_all_episode_images(episode_data)
-            
+            # 加载所有episode图片；转入线程执行，避免解码期间阻塞事件循环
+            images = await asyncio.to_thread(self._load_all_episode_images, episode_data)
+
             if not images:
                 print(f"  错误: 未能加载任何图片")
                 return None
-            
+
             # 创建提示词
             prompt = self._create_analysis_prompt(episode_data)
-            
+
             # 调用API
             print(f"  调用Gemini API生成高层次分析...")
-            result = self._call_gemini_api(prompt, images, HighLevelAnalysis)
+            result = await self._call_gemini_api(prompt, images, HighLevelAnalysis)
             
             if result:
                 print(f"  ✅ 成功生成高层次分析")
@@ -222,23 +433,23 @@ class HighLevelCorrectionGenerator:
             print(f"  ❌ 处理过程中出错: {e}")
             return None
     
-    def process_single_episode(self, episode_data: Dict[str, Any], episode_id: int = None) -> Dict[str, Any]:
+    async def process_single_episode(self, episode_data: Dict[str, Any], episode_id: int = None) -> Dict[str, Any]:
         """处理单个episode，生成高层次分析"""
 
         # 如果episode_id为None，则从数据中提取
         if episode_id is None:
             episode_id = self._extract_episode_id(episode_data)
-        
+
         result = {
             "episode_id": f"episode_{episode_id}",
             "task": episode_data.get('task', ''),
             "failure_type": episode_data.get('failure_type', ''),
             "failure_subtask": episode_data.get('failure_subtask', ''),
         }
-        
+
         if episode_data.get('failure_detection', '') == 'yes':
             # 生成高层次分析
-            high_level_analysis = self.generate_high_level_analysis(episode_data)
+            high_level_analysis = await self.generate_high_level_analysis(episode_data)
             if high_level_analysis:
                 result.update(high_level_analysis.model_dump())
         else:
@@ -247,49 +458,62 @@ class HighLevelCorrectionGenerator:
                 "correction_high_level": "",
                 "reasoning": ""
             })
-        
-        # 添加延迟以避免API限制
-        time.sleep(PROCESSING_CONFIG["api_call_delay"])
-        
+
         return result
     
-    def process_task(self, task_name: str, episode_indices: Optional[List[int]] = None) -> None:
-        """处理单个任务，可选处理指定的episodes列表；为空则处理全部"""
-        annotation_path = Path('data') / f"{task_name}/{task_name}_annotations.json"
-
-        with open(annotation_path, 'r', encoding='utf-8') as f:
-            episodes = json.load(f)
-        total = len(episodes)
-
-        # 增加episode索引映射，遍历episodes，用extract_episode_id提取episode_id，并映射到索引
-        episode_id_to_index = {}
-        for i, episode in enumerate(episodes):
-            episode_id = self._extract_episode_id(episode)
-            episode_id_to_index[episode_id] = i
-
-        # 将episode_indices映射到索引
-        if episode_indices is None:
-            indices_to_process = list(range(total))
-        else:
-            indices_to_process = [episode_id_to_index[i] for i in episode_indices if 0 <= i < total]
+    async def process_task(self, task_name: str, episode_indices: Optional[List[int]] = None) -> None:
+        """处理单个任务，可选处理指定的episodes列表；为空则处理全部
+
+        episode之间相互独立且以I/O等待为主，因此通过asyncio并发处理，
+        并用信号量限制同时进行的API调用数量。
+        """
+        # 优先消费_load_task_episodes留下的缓存（如main中刚做过计数），
+        # 否则流式遍历标注文件；两种方式下标注文件都只解析一次
+        entries = self._episode_cache.pop(task_name, None)
+        if entries is None:
+            annotation_path = Path('data') / f"{task_name}/{task_name}_annotations.json"
+            entries = ((idx, self._extract_episode_id(episode_data), episode_data)
+                       for idx, episode_data in enumerate(self._iter_episodes(annotation_path)))
+
+        # 只保留被选中的episode，内存不随任务规模膨胀
+        selected_ids = set(episode_indices) if episode_indices is not None else None
+        total = 0
+        to_process = []  # (原始索引, episode_id, episode数据)
+        for idx, episode_id, episode_data in entries:
+            total += 1
+            if selected_ids is None or episode_id in selected_ids:
+                to_process.append((idx, episode_id, episode_data))
 
         task_dir = self.output_dir / task_name
         task_dir.mkdir(exist_ok=True)
-        print(f"\n开始处理任务: {task_name}，共 {len(indices_to_process)}/{total} 个episode")
-        for i, idx in enumerate(indices_to_process, 1):
-            episode_data = episodes[idx]
-            print(f"\n处理 {i}/{len(indices_to_process)} 个数据点 (原始索引: {idx})")
-            episode_id = self._extract_episode_id(episode_data)
-            print(f"Episode ID: episode_{episode_id}")
-            result = self.process_single_episode(episode_data, episode_id)
-            episode_output_file = task_dir / f"episode_{episode_id}_high_level.json"
-            with open(episode_output_file, 'w', encoding='utf-8') as f:
-                json_indent = 4
-                json.dump(result, f, ensure_ascii=False, indent=json_indent)
-            print(f"已保存: {episode_output_file}")
-            time.sleep(PROCESSING_CONFIG["episode_processing_delay"])
+        print(f"\n开始处理任务: {task_name}，共 {len(to_process)}/{total} 个episode")
+        semaphore = asyncio.Semaphore(BATCH_PROCESSING_CONFIG["batch_size"])
+
+        async def _process_one(i: int, idx: int, episode_id: int, episode_data: Dict[str, Any]) -> None:
+            # 断点续跑：每个episode的结果文件即检查点，已存在则跳过
+            if PROCESSING_CONFIG["skip_existing_results"]:
+                episode_output_file = task_dir / f"episode_{episode_id}_high_level.json"
+                if episode_output_file.exists():
+                    print(f"跳过 episode_{episode_id}: 结果文件已存在")
+                    return
+            async with semaphore:
+                print(f"\n处理 {i}/{len(to_process)} 个数据点 (原始索引: {idx})")
+                print(f"Episode ID: episode_{episode_id}")
+                result = await self.process_single_episode(episode_data, episode_id)
+            # 分析失败的episode不落盘：结果文件即检查点，写了就不会重试
+            if 'reasoning' not in result:
+                print(f"  episode_{episode_id} 未生成分析结果，跳过写入，重跑时将重试")
+                return
+            # 写入在信号量之外并转入线程执行：落盘与下一个API调用重叠，
+            # 不占用并发额度，也不阻塞事件循环
+            await asyncio.to_thread(self._write_episode_result, task_dir, episode_id, result)
+
+        tasks = [_process_one(i, idx, episode_id, episode_data)
+                 for i, (idx, episode_id, episode_data) in enumerate(to_process, 1)]
+        await asyncio.gather(*tasks)
+        self._write_task_summary(task_dir, task_name)
     
-    def process_annotation_file(self, annotation_file: str) -> None:
+    async def process_annotation_file(self, annotation_file: str) -> None:
         """处理标注文件，生成所有episode的高层次信息"""
         # 为向后兼容保留该接口，内部委托到统一的 process_task
         annotation_path = Path('data') / annotation_file
@@ -297,22 +521,187 @@ class HighLevelCorrectionGenerator:
             print(f"标注文件不存在: {annotation_path}")
             return
         task_name = annotation_path.stem.replace('_annotations', '')
-        self.process_task(task_name)
+        await self.process_task(task_name)
     
-    def process_all_tasks(self) -> None:
+    def _image_to_inline_part(self, part: types.Part) -> Dict[str, Any]:
+        """将图片Part编码为Batch Mode请求可序列化的inline_data部分"""
+        return {
+            "inline_data": {
+                "mime_type": part.inline_data.mime_type,
+                "data": base64.b64encode(part.inline_data.data).decode('ascii'),
+            }
+        }
+
+    def process_annotation_file_batch(self, annotation_file: str) -> None:
+        """使用Gemini Batch Mode处理标注文件，一次提交所有episode的请求
+
+        相比逐个同步调用，批处理模式将总耗时从 O(episode数 × 单次延迟)
+        压缩为单个异步作业，且费用减半。
+        """
+        annotation_path = Path('data') / annotation_file
+        if not annotation_path.exists():
+            print(f"标注文件不存在: {annotation_path}")
+            return
+        task_name = annotation_path.stem.replace('_annotations', '')
+
+        task_dir = self.output_dir / task_name
+        task_dir.mkdir(exist_ok=True)
+
+        # 构建每个episode的请求，未检测到失败的episode直接写空结果
+        batch_requests = []
+        base_results = {}
+        for episode_data in self._iter_episodes(annotation_path):
+            episode_id = self._extract_episode_id(episode_data)
+            # 断点续跑：已有结果文件的episode不再重复提交
+            if PROCESSING_CONFIG["skip_existing_results"]:
+                episode_output_file = task_dir / f"episode_{episode_id}_high_level.json"
+                if episode_output_file.exists():
+                    print(f"跳过 episode_{episode_id}: 结果文件已存在")
+                    continue
+            result = {
+                "episode_id": f"episode_{episode_id}",
+                "task": episode_data.get('task', ''),
+                "failure_type": episode_data.get('failure_type', ''),
+                "failure_subtask": episode_data.get('failure_subtask', ''),
+            }
+            base_results[episode_id] = result
+
+            if episode_data.get('failure_detection', '') != 'yes':
+                result.update({
+                    "avoidance_high_level": "",
+                    "correction_high_level": "",
+                    "reasoning": ""
+                })
+                self._write_episode_result(task_dir, episode_id, result)
+                continue
+
+            images = self._load_all_episode_images(episode_data)
+            if not images:
+                print(f"  警告: episode_{episode_id} 未能加载任何图片，已跳过")
+                continue
+            prompt = self._create_analysis_prompt(episode_data)
+            parts = [self._image_to_inline_part(part) for part in images]
+            parts.append({"text": prompt})
+            batch_requests.append({
+                "key": f"episode_{episode_id}",
+                "request": {
+                    "contents": [{"parts": parts}],
+                    "generation_config": {
+                        "response_mime_type": GEMINI_CONFIG["response_mime_type"],
+                        "response_schema": HighLevelAnalysis.model_json_schema(),
+                        "temperature": GEMINI_CONFIG["temperature"],
+                    },
+                },
+            })
+
+        if not batch_requests:
+            print(f"任务 {task_name} 没有需要调用API的episode")
+            return
+
+        # 将请求写入JSONL文件并上传
+        batch_input_file = task_dir / f"{task_name}_batch_requests.jsonl"
+        with open(batch_input_file, 'wb') as f:
+            for request in batch_requests:
+                f.write(_json_dumps(request) + b'\n')
+        print(f"已生成批处理请求文件: {batch_input_file} ({len(batch_requests)} 个请求)")
+
+        uploaded_file = self.client.files.upload(
+            file=str(batch_input_file),
+            config=types.UploadFileConfig(
+                display_name=f"{task_name}_batch_requests",
+                mime_type='jsonl'
+            )
+        )
+        batch_job = self.client.batches.create(
+            model=self.model,
+            src=uploaded_file.name,
+            config={"display_name": f"{task_name}_high_level_batch"},
+        )
+        print(f"批处理作业已提交: {batch_job.name}")
+
+        # 轮询作业状态直至完成
+        completed_states = {
+            'JOB_STATE_SUCCEEDED',
+            'JOB_STATE_FAILED',
+            'JOB_STATE_CANCELLED',
+            'JOB_STATE_EXPIRED',
+        }
+        while batch_job.state.name not in completed_states:
+            print(f"  作业状态: {batch_job.state.name}，等待中...")
+            time.sleep(BATCH_PROCESSING_CONFIG["poll_interval"])
+            batch_job = self.client.batches.get(name=batch_job.name)
+
+        if batch_job.state.name != 'JOB_STATE_SUCCEEDED':
+            print(f"批处理作业未成功: {batch_job.state.name}")
+            return
+
+        # 下载结果文件，按key分发到各episode的输出文件
+        result_bytes = self.client.files.download(file=batch_job.dest.file_name)
+        saved = 0
+        for line in result_bytes.splitlines():
+            if not line.strip():
+                continue
+            entry = _json_loads(line)
+            key = entry.get('key', '')
+            match = _RESULT_KEY_RE.match(key)
+            if not match:
+                print(f"  警告: 无法识别的结果key '{key}'")
+                continue
+            episode_id = int(match.group(1))
+            if 'error' in entry:
+                print(f"  警告: {key} 请求失败: {entry['error']}")
+                continue
+            try:
+                response_text = entry['response']['candidates'][0]['content']['parts'][0]['text']
+                analysis = HighLevelAnalysis.model_validate_json(response_text)
+            except Exception as e:
+                print(f"  警告: 解析 {key} 的响应失败: {e}")
+                continue
+            result = base_results[episode_id]
+            result.update(analysis.model_dump())
+            self._write_episode_result(task_dir, episode_id, result)
+            saved += 1
+        print(f"批处理完成，已保存 {saved}/{len(batch_requests)} 个episode结果")
+        self._write_task_summary(task_dir, task_name)
+
+    def _write_episode_result(self, task_dir: Path, episode_id: int, result: Dict[str, Any]) -> None:
+        """保存单个episode的结果文件（先写临时文件再原子替换）"""
+        episode_output_file = task_dir / f"episode_{episode_id}_high_level.json"
+        tmp_file = episode_output_file.with_suffix('.json.tmp')
+        tmp_file.write_bytes(_json_dumps(result, indent=True))
+        os.replace(tmp_file, episode_output_file)
+        print(f"已保存: {episode_output_file}")
+
+    def _write_task_summary(self, task_dir: Path, task_name: str) -> None:
+        """汇总所有episode结果，单次原子写出任务级结果文件
+
+        中断只会留下完整的旧文件或完整的新文件，不会出现半写状态。
+        """
+        result_files = sorted(
+            task_dir.glob('episode_*_high_level.json'),
+            key=lambda p: int(_RESULT_KEY_RE.match(p.name).group(1))
+        )
+        results = [_json_loads(file.read_bytes()) for file in result_files]
+        summary_file = task_dir / f"{task_name}_high_level.json"
+        tmp_file = summary_file.with_suffix('.json.tmp')
+        tmp_file.write_bytes(_json_dumps(results, indent=True))
+        os.replace(tmp_file, summary_file)
+        print(f"已保存任务汇总 ({len(results)} 个episode): {summary_file}")
+
+    async def process_all_tasks(self) -> None:
         """处理data目录下的所有任务"""
         data_dir = Path('data')
-        
+
         for task_dir in data_dir.iterdir():
             if task_dir.is_dir():
                 annotation_file = task_dir / f"{task_dir.name}_annotations.json"
                 if annotation_file.exists():
-                    self.process_task(task_dir.name)
+                    await self.process_task(task_dir.name)
                 else:
                     print(f"跳过 {task_dir.name}: 未找到标注文件")
 
 
-def main():
+async def main():
     """主函数"""
     print("高层次纠正信息生成器")
     print("=" * 50)
@@ -336,7 +725,7 @@ def main():
     choice = input("请输入选择 (1 或 2): ").strip()
     
     if choice == "1":
-        generator.process_all_tasks()
+        await generator.process_all_tasks()
     elif choice == "2":
         # 列出可用的任务
         data_dir = Path('data')
@@ -363,7 +752,7 @@ def main():
                 print(f"\n可用的episode:\nepisode_0-episode_{episode_id_count-1}")
                 selection = input("请输入episode选择（ALL/空 表示全部；支持 0,3-5,7）: ")
                 indices = generator.parse_episode_selection(selection, episode_id_count)
-                generator.process_task(selected_task, indices)
+                await generator.process_task(selected_task, indices)
             else:
                 print("无效的任务选择")
         except ValueError:
@@ -373,4 +762,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
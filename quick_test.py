@@ -6,6 +6,7 @@
 
 import os
 import json
+import asyncio
 from pathlib import Path
 from high_level_correction_generator import HighLevelCorrectionGenerator
 
@@ -27,21 +28,17 @@ def test_single_episode():
             annotation_file = task_dir / f"{task_dir.name}_annotations.json"
             if annotation_file.exists():
                 print(f"找到任务: {task_dir.name}")
-                
-                # 读取第一个episode进行测试
-                with open(annotation_file, 'r', encoding='utf-8') as f:
-                    episodes = json.load(f)
-                
-                if episodes:
+
+                # 创建生成器
+                generator = HighLevelCorrectionGenerator()
+
+                # 流式读取第一个episode进行测试，不加载整个标注文件
+                episode_data = next(generator._iter_episodes(annotation_file), None)
+
+                if episode_data is not None:
                     print(f"测试第一个episode...")
-                    
-                    # 创建生成器
-                    generator = HighLevelCorrectionGenerator()
-                    
-                    # 处理第一个episode
-                    episode_data = episodes[0]
-                    
-                    result = generator.process_single_episode(episode_data)
+
+                    result = asyncio.run(generator.process_single_episode(episode_data))
                     
                     # 保存测试结果
                     test_output_file = Path("output") / f"test_result.json"